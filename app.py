@@ -1,20 +1,32 @@
 ﻿import os
+import functools
+import gc
+import hashlib
+import itertools
+import math
+import re
+import shutil
+import urllib.request
 import gtfs_kit as gk
 from dash import Dash, html, dcc, Input, Output, callback, State, ALL
+from flask import Response, abort
 import dash_leaflet as dl
 import plotly.express as px
+import plotly.io as pio
+import orjson
+import numpy as np
 import pandas as pd
+import polars as pl
 import geopandas as gpd
-from shapely.geometry import Point
+import shapely
+from shapely.geometry import mapping
 
-print("Loading GTFS feed...")
-feed = gk.read_feed("https://gtfs.at.govt.nz/gtfs.zip", dist_units="km")
-feed = feed.clean()
-
-week = feed.get_first_week()
-trip_stats = feed.compute_trip_stats()
-feed_stats = feed.compute_feed_stats(trip_stats, dates=[week[5]])
-feed_time_series = feed.compute_feed_time_series(trip_stats, dates=[week[5]], freq='60Min')
+GTFS_URL = "https://gtfs.at.govt.nz/gtfs.zip"
+CACHE_DIR = os.environ.get("GTFS_CACHE_DIR", "cache")
+# Bump whenever the cached tables' schema or computation changes, so old caches are not reused
+CACHE_VERSION = 2
+ROUTE_GEOMETRY_COLUMNS = ['route_id', 'route_short_name', 'route_type', 'geometry']
+STOP_GEOMETRY_COLUMNS = ['stop_id', 'stop_name', 'geometry']
 
 colors = {
     0: "#9b59b6",   # LightRail
@@ -41,50 +53,255 @@ types = {
     12: "Monorail"
 }
 
-route_stats = feed.compute_route_stats(trip_stats, dates=[week[5]])
-route_stats['route_color'] = route_stats['route_type'].map(colors)
-route_stats['route_desc'] = route_stats['route_type'].map(types)
+# Lookup tables indexed by route type position; -1 (unlisted type) picks the trailing default
+ROUTE_TYPE_INDEX = pd.Index(list(types))
+COLOR_LUT = np.array([colors[t] for t in ROUTE_TYPE_INDEX] + ['#95a5a6'])
+DESC_LUT = np.array([types[t] for t in ROUTE_TYPE_INDEX] + ['Unknown'])
 
-try:
-    routes_gdf = feed.geometrize_routes()
-    routes_gdf['route_color'] = routes_gdf['route_type'].map(colors)
-    routes_gdf['route_desc'] = routes_gdf['route_type'].map(types)
-    print(f"Loaded {len(routes_gdf)} route geometries")
-except Exception as e:
-    print(f"Could not load route geometries: {e}")
-    routes_gdf = None
+def lookup_route_type(route_type, lut):
+    return lut[ROUTE_TYPE_INDEX.get_indexer(route_type)]
+
+print("Downloading GTFS feed...")
+with urllib.request.urlopen(GTFS_URL) as response:
+    gtfs_zip = response.read()
+
+# Computed feed data is cached per cache version and feed, keyed by the zip's content hash
+feed_hash = hashlib.sha256(gtfs_zip).hexdigest()[:16]
+cache_path = os.path.join(CACHE_DIR, f"v{CACHE_VERSION}-{feed_hash}")
+
+def cache_file(name):
+    return os.path.join(cache_path, name)
+
+# The cache directory only appears once fully written (see the rename below),
+# so its presence marks a complete cache; an unreadable one is rebuilt
+cache_hit = os.path.isdir(cache_path)
+if cache_hit:
+    try:
+        print(f"Loading cached GTFS data from {cache_path}...")
+        trip_stats = pd.read_parquet(cache_file('trip_stats.parquet'))
+        feed_stats = pd.read_parquet(cache_file('feed_stats.parquet'))
+        feed_time_series = pd.read_parquet(cache_file('feed_time_series.parquet'))
+        route_stats = pd.read_parquet(cache_file('route_stats.parquet'))
+        stop_stats = pd.read_parquet(cache_file('stop_stats.parquet'))
+        stop_route_info = pd.read_parquet(cache_file('stop_route_info.parquet'))
+        routes_df = pd.read_parquet(cache_file('routes.parquet'))
+        if os.path.exists(cache_file('routes.geoparquet')):
+            routes_gdf = gpd.read_parquet(cache_file('routes.geoparquet'))
+        else:
+            routes_gdf = None
+        stops_gdf = gpd.read_parquet(cache_file('stops.geoparquet'))
+    except Exception as e:
+        print(f"Could not read GTFS cache, rebuilding it: {e}")
+        cache_hit = False
+    else:
+        # The zip is only needed to rebuild the cache; don't keep it alive as a module global
+        del gtfs_zip
 
-stops_gdf = feed.geometrize_stops()
-stop_stats = feed.compute_stop_stats(dates=[week[5]])
+if not cache_hit:
+    print("Loading GTFS feed...")
+    # Write into a private sibling directory and rename it into place when complete
+    tmp_path = cache_path + f".tmp-{os.getpid()}"
+    os.makedirs(tmp_path, exist_ok=True)
+    with open(os.path.join(tmp_path, 'gtfs.zip'), 'wb') as f:
+        f.write(gtfs_zip)
+    del gtfs_zip
+    feed = gk.read_feed(os.path.join(tmp_path, 'gtfs.zip'), dist_units="km")
+    feed = feed.clean()
+    os.remove(os.path.join(tmp_path, 'gtfs.zip'))
 
-stop_times = feed.stop_times.copy()
-trips = feed.trips.copy()
-stop_route_info = stop_times.merge(trips[['trip_id', 'route_id']], on='trip_id')
-stop_route_info = stop_route_info.merge(feed.routes[['route_id', 'route_type']], on='route_id')
+    week = feed.get_first_week()
+    trip_stats = feed.compute_trip_stats()
+    feed_stats = feed.compute_feed_stats(trip_stats, dates=[week[5]])
+    feed_time_series = feed.compute_feed_time_series(trip_stats, dates=[week[5]], freq='60Min')
+    route_stats = feed.compute_route_stats(trip_stats, dates=[week[5]])
+    stop_stats = feed.compute_stop_stats(dates=[week[5]])
+    routes_df = feed.routes
+
+    # Keep only the columns the map uses so the GeoParquet files stay small and fast to read
+    try:
+        routes_gdf = feed.geometrize_routes()
+        routes_gdf = routes_gdf[[c for c in ROUTE_GEOMETRY_COLUMNS if c in routes_gdf.columns]]
+    except Exception as e:
+        print(f"Could not load route geometries: {e}")
+        routes_gdf = None
+    stops_gdf = feed.geometrize_stops()
+    stops_gdf = stops_gdf[[c for c in STOP_GEOMETRY_COLUMNS if c in stops_gdf.columns]]
+
+    # Join in Polars (multithreaded); only the id/type columns are used downstream
+    stop_route_info = (
+        pl.from_pandas(feed.stop_times[['trip_id', 'stop_id']])
+        .join(pl.from_pandas(feed.trips[['trip_id', 'route_id']]), on='trip_id')
+        .join(pl.from_pandas(feed.routes[['route_id', 'route_type']]), on='route_id')
+        .to_pandas()
+    )
+
+    print(f"Writing GTFS cache to {cache_path}...")
+    for name, df in [
+        ('trip_stats', trip_stats), ('feed_stats', feed_stats), ('feed_time_series', feed_time_series),
+        ('route_stats', route_stats), ('stop_stats', stop_stats), ('stop_route_info', stop_route_info),
+        ('routes', routes_df),
+    ]:
+        df.to_parquet(os.path.join(tmp_path, f'{name}.parquet'), engine="pyarrow", compression="zstd")
+    if routes_gdf is not None:
+        routes_gdf.to_parquet(os.path.join(tmp_path, 'routes.geoparquet'), compression="zstd")
+    stops_gdf.to_parquet(os.path.join(tmp_path, 'stops.geoparquet'), compression="zstd")
 
-stop_primary_type = stop_route_info.groupby('stop_id')['route_type'].agg(
-    lambda x: x.mode().iloc[0] if len(x.mode()) > 0 else x.iloc[0]
-).reset_index()
-stop_primary_type.columns = ['stop_id', 'primary_route_type']
+    # Replace an unreadable cache; if another process got there first, keep its copy
+    shutil.rmtree(cache_path, ignore_errors=True)
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    # Drop caches for older feeds or cache versions; in-progress .tmp- directories are left alone
+    for name in os.listdir(CACHE_DIR):
+        if re.fullmatch(r"v\d+-[0-9a-f]{16}", name) and os.path.join(CACHE_DIR, name) != cache_path:
+            shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+    # Don't keep the raw feed (full stop_times etc.) alive as a module global
+    del feed
+
+def downcast_numeric(df):
+    # Shrink int64/float64 columns to the smallest dtype that holds their values
+    for col in df.select_dtypes(include='number').columns:
+        kind = 'integer' if pd.api.types.is_integer_dtype(df[col]) else 'float'
+        df[col] = pd.to_numeric(df[col], downcast=kind)
+    return df
+
+for df in (trip_stats, route_stats, stop_stats):
+    downcast_numeric(df)
+
+# route_type only takes a handful of values; keep it in the smallest integer dtype everywhere
+for df in (routes_gdf, stop_route_info):
+    if df is not None:
+        df['route_type'] = pd.to_numeric(df['route_type'], downcast='integer')
+
+route_stats['route_color'] = lookup_route_type(route_stats['route_type'], COLOR_LUT)
+route_stats['route_desc'] = lookup_route_type(route_stats['route_type'], DESC_LUT)
+
+# Stats indexed by id for hashed lookups in the click callback
+ROUTE_STATS_BY_ID = {
+    row.route_id: row
+    for row in route_stats[~route_stats['route_id'].duplicated()][[
+        'route_id', 'route_short_name', 'route_desc', 'num_trips',
+        'start_time', 'end_time', 'service_distance', 'service_speed',
+    ]].itertuples(index=False)
+}
+stop_stats_idx = stop_stats[~stop_stats['stop_id'].duplicated()].set_index('stop_id', drop=False)
+
+if routes_gdf is not None:
+    routes_gdf['route_color'] = lookup_route_type(routes_gdf['route_type'], COLOR_LUT)
+    routes_gdf['route_desc'] = lookup_route_type(routes_gdf['route_type'], DESC_LUT)
+    # Drop sub-~10 m vertices and snap to 5 decimals to cut the map payload
+    routes_gdf['geometry'] = shapely.set_precision(
+        routes_gdf.geometry.simplify(1e-4, preserve_topology=False).values, 1e-5
+    )
+    print(f"Loaded {len(routes_gdf)} route geometries")
+
+# Most frequent route type per stop, counted into a (stop x route type) table;
+# argmax picks the lowest route type on ties, as mode() did
+stop_codes, stop_ids = pd.factorize(stop_route_info['stop_id'])
+type_codes, route_types = pd.factorize(stop_route_info['route_type'], sort=True)
+stop_type_counts = np.bincount(
+    stop_codes * len(route_types) + type_codes, minlength=len(stop_ids) * len(route_types)
+).reshape(len(stop_ids), len(route_types))
+stop_primary_type = pd.DataFrame({
+    'stop_id': stop_ids,
+    'primary_route_type': route_types[stop_type_counts.argmax(axis=1)],
+})
 
 stops_gdf = stops_gdf.merge(stop_primary_type, on='stop_id', how='left')
-stops_gdf['stop_color'] = stops_gdf['primary_route_type'].map(colors).fillna('#95a5a6')
-stops_gdf['stop_desc'] = stops_gdf['primary_route_type'].map(types).fillna('Unknown')
+# Stops without trips (e.g. parent stations) get -1, which the lookup tables treat as unknown
+stops_gdf['primary_route_type'] = pd.to_numeric(stops_gdf['primary_route_type'].fillna(-1), downcast='integer')
+stops_gdf['stop_color'] = lookup_route_type(stops_gdf['primary_route_type'], COLOR_LUT)
+stops_gdf['stop_desc'] = lookup_route_type(stops_gdf['primary_route_type'], DESC_LUT)
 
-am_peak_trips = trip_stats[(trip_stats['start_time'] >= '07:00:00') & (trip_stats['start_time'] <= '09:00:00') & (trip_stats['direction_id'] == 0)].copy()
+# Bucket stops into a fixed lon/lat grid so a viewport only touches the cells it covers
+STOP_CELL_SIZE = 0.01  # degrees, roughly 1 km
+stop_xy = shapely.get_coordinates(stops_gdf.geometry.values)
+stop_x, stop_y = stop_xy[:, 0], stop_xy[:, 1]
+STOP_LON_MIN, STOP_LON_MAX = float(stop_x.min()), float(stop_x.max())
+STOP_LAT_MIN, STOP_LAT_MAX = float(stop_y.min()), float(stop_y.max())
+stop_cells = pd.Series(np.arange(len(stops_gdf))).groupby([
+    np.floor(stop_x / STOP_CELL_SIZE).astype(np.int64),
+    np.floor(stop_y / STOP_CELL_SIZE).astype(np.int64),
+]).indices
+
+# Every stop's feature is built once; update_stops only picks the visible ones
+stop_features = [
+    {
+        "type": "Feature",
+        "properties": {"stop_id": str(stop_id), "name": str(name), "type": desc},
+        "geometry": mapping(geom),
+    }
+    for geom, stop_id, name, desc in zip(
+        stops_gdf.geometry.values,
+        stops_gdf['stop_id'].values,
+        stops_gdf.get('stop_name', stops_gdf['stop_id']).values,
+        stops_gdf['stop_desc'].values,
+    )
+]
+
+start_hms = trip_stats['start_time'].str.split(':', expand=True).astype('float64')
+trip_stats['start_seconds'] = start_hms[0] * 3600 + start_hms[1] * 60 + start_hms[2]
+
+am_peak_trips = trip_stats.loc[
+    (trip_stats['start_seconds'] >= 7 * 3600) & (trip_stats['start_seconds'] <= 9 * 3600) & (trip_stats['direction_id'] == 0),
+    ['route_id', 'trip_id'],
+]
 route_frequencies = am_peak_trips.groupby('route_id')['trip_id'].count().reset_index(name='num_trips')
 route_frequencies['headway'] = 120 / route_frequencies['num_trips'].replace(0, 1)
-route_frequencies['headway_name'] = route_frequencies['headway'].apply(lambda x: "frequent" if x <= 15 else "connector" if x <= 30 else "local")
+headway_minutes = route_frequencies['headway'].to_numpy()
+route_frequencies['headway_name'] = np.select([headway_minutes <= 15, headway_minutes <= 30], ['frequent', 'connector'], default='local')
 
-routes_gdf = routes_gdf.merge(
-    route_frequencies[['route_id', 'headway_name']], 
-    on='route_id', 
-    how='left',
-).fillna({'headway_name': 'unknown'})
+if routes_gdf is not None:
+    routes_gdf = routes_gdf.merge(
+        route_frequencies[['route_id', 'headway_name']], 
+        on='route_id', 
+        how='left',
+    )
+    routes_gdf['headway_name'] = routes_gdf['headway_name'].fillna('unknown')
 
-print(f"Loaded {len(feed.routes)} routes and {len(stops_gdf)} stops")
+# Prebuild encoded route FeatureCollections per (route_type, headway) map layer
+ROUTE_LAYER_GEOJSON = {}
+if routes_gdf is not None:
+    route_features = [
+        {
+            "type": "Feature",
+            "properties": {"route_id": str(route_id), "name": str(name), "type": desc},
+            # Missing shapes, or ones collapsed to EMPTY by set_precision, are skipped below
+            "geometry": mapping(geom) if geom is not None and not geom.is_empty else None,
+        }
+        for geom, route_id, name, desc in zip(
+            routes_gdf.geometry.values,
+            routes_gdf['route_id'].values,
+            routes_gdf.get('route_short_name', routes_gdf['route_id']).values,
+            routes_gdf['route_desc'].values,
+        )
+    ]
+    for layer, rows in routes_gdf.groupby(['route_type', 'headway_name']).indices.items():
+        features = [route_features[i] for i in rows if route_features[i]["geometry"] is not None]
+        if features:
+            ROUTE_LAYER_GEOJSON[layer] = orjson.dumps({"type": "FeatureCollection", "features": features})
+
+print(f"Loaded {len(routes_df)} routes and {len(stops_gdf)} stops")
+
+# Dash encodes layouts and callback responses through plotly's JSON engine
+pio.json.config.default_engine = "orjson"
 
 app = Dash(__name__, suppress_callback_exceptions=True)
+# WSGI entry point; run under `gunicorn --preload` so workers share the feed data copy-on-write
+server = app.server
+
+# Route layers are fetched by the browser rather than inlined in the layout. The feed
+# hash is part of the URL, so a new feed never serves cached geometries from the old one.
+@server.route(app.config.routes_pathname_prefix + "routes/<version>/<headway>/<int:route_type>.geojson")
+def route_layer_geojson(version, headway, route_type):
+    data = ROUTE_LAYER_GEOJSON.get((route_type, headway))
+    if version != feed_hash or data is None:
+        abort(404)
+    response = Response(data, mimetype="application/geo+json")
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
 
 def create_map():
     map_children = [dl.TileLayer()]
@@ -92,33 +309,17 @@ def create_map():
     # Add routes in separate layers
     if routes_gdf is not None:
         for route_type, color in colors.items():
-            type_routes = routes_gdf[routes_gdf['route_type'] == route_type].copy()
             for headway in ['frequent', 'connector', 'local']:
-                headway_routes = type_routes[type_routes['headway_name'] == headway].copy()
-                if len(headway_routes) > 0:
-                    features = []
+                if (route_type, headway) in ROUTE_LAYER_GEOJSON:
                     weight = 6 if headway == 'frequent' else 3 if headway == 'connector' else 1
-                    for _, route in headway_routes.iterrows():
-                        if hasattr(route.geometry, '__geo_interface__'):
-                            features.append({
-                                "type": "Feature",
-                                "properties": {
-                                    "route_id": str(route['route_id']),
-                                    "name": str(route.get('route_short_name', route['route_id'])),
-                                    "type": route['route_desc'],
-                                },
-                                "geometry": route.geometry.__geo_interface__
-                            })
-                
-                    if features:
-                        map_children.append(
-                            dl.GeoJSON(
-                                data={"type": "FeatureCollection", "features": features},
-                                id={"type": "route-layer", "index": f"{headway}-{route_type}"},
-                                options={"style": {"color": color, "opacity": 0.8, "weight": weight}},
-                                hoverStyle={"color": "#f39c12", "weight": weight + 2, "opacity": 1},
-                            )
+                    map_children.append(
+                        dl.GeoJSON(
+                            url=app.get_relative_path(f"/routes/{feed_hash}/{headway}/{route_type}.geojson"),
+                            id={"type": "route-layer", "index": f"{headway}-{route_type}"},
+                            options={"style": {"color": color, "opacity": 0.8, "weight": weight}},
+                            hoverStyle={"color": "#f39c12", "weight": weight + 2, "opacity": 1},
                         )
+                    )
     
     # Add empty stops layer
     map_children.append(dl.GeoJSON(
@@ -141,6 +342,33 @@ def create_map():
         zoom=10
     )
 
+@functools.lru_cache(maxsize=512)
+def stops_in_bbox(lon_min, lat_min, lon_max, lat_max):
+    # Bounds come from the client; clamp them to the stops so the cell walk stays bounded
+    cell_lon_min, cell_lon_max = max(lon_min, STOP_LON_MIN), min(lon_max, STOP_LON_MAX)
+    cell_lat_min, cell_lat_max = max(lat_min, STOP_LAT_MIN), min(lat_max, STOP_LAT_MAX)
+    cell_x = range(int(np.floor(cell_lon_min / STOP_CELL_SIZE)), int(np.floor(cell_lon_max / STOP_CELL_SIZE)) + 1)
+    cell_y = range(int(np.floor(cell_lat_min / STOP_CELL_SIZE)), int(np.floor(cell_lat_max / STOP_CELL_SIZE)) + 1)
+    if len(cell_x) * len(cell_y) > len(stop_cells):
+        rows = [
+            r for (cx, cy), r in stop_cells.items()
+            if cell_x.start <= cx < cell_x.stop and cell_y.start <= cy < cell_y.stop
+        ]
+    else:
+        rows = [stop_cells[cell] for cell in itertools.product(cell_x, cell_y) if cell in stop_cells]
+    if not rows:
+        return {"type": "FeatureCollection", "features": []}
+    
+    # Sort so the 200 cap keeps stops in frame order
+    idx = np.sort(np.concatenate(rows))
+    idx = idx[
+        (stop_x[idx] >= lon_min) & (stop_x[idx] <= lon_max) &
+        (stop_y[idx] >= lat_min) & (stop_y[idx] <= lat_max)
+    ][:200]
+    features = [stop_features[i] for i in idx]
+    
+    return {"type": "FeatureCollection", "features": features}
+
 @callback(
     Output("stops-layer", "data"),
     [Input("map", "zoom"), Input("map", "bounds")]
@@ -153,24 +381,11 @@ def update_stops(zoom, bounds):
     lat_min, lat_max = bounds[0][0], bounds[1][0]
     lon_min, lon_max = bounds[0][1], bounds[1][1]
     
-    visible_stops = stops_gdf[
-        (stops_gdf.geometry.y >= lat_min) & (stops_gdf.geometry.y <= lat_max) &
-        (stops_gdf.geometry.x >= lon_min) & (stops_gdf.geometry.x <= lon_max)
-    ].head(200)
-    
-    features = []
-    for _, stop in visible_stops.iterrows():
-        features.append({
-            "type": "Feature",
-            "properties": {
-                "stop_id": str(stop['stop_id']),
-                "name": str(stop.get('stop_name', stop['stop_id'])),
-                "type": stop['stop_desc']
-            },
-            "geometry": Point(stop.geometry.x, stop.geometry.y).__geo_interface__
-        })
-    
-    return {"type": "FeatureCollection", "features": features}
+    # Snap the viewport outward to 0.001 degrees (~100 m) so small pans hit the cache
+    return stops_in_bbox(
+        math.floor(lon_min * 1000) / 1000, math.floor(lat_min * 1000) / 1000,
+        math.ceil(lon_max * 1000) / 1000, math.ceil(lat_max * 1000) / 1000,
+    )
 
 @callback(
     Output("info-display", "children"),
@@ -180,9 +395,8 @@ def display_info(stop_click, route_clicks):
     # Check stops click
     if stop_click:
         stop_id = stop_click['properties']['stop_id']
-        stop_stat = stop_stats[stop_stats['stop_id'] == stop_id]
-        if not stop_stat.empty:
-            stat = stop_stat.iloc[0]
+        if stop_id in stop_stats_idx.index:
+            stat = stop_stats_idx.loc[stop_id]
             return html.Div([
                 html.H4(f"ðﾟﾚﾏ {stop_click['properties']['name']}", style={'margin': '0 0 10px 0', 'color': '#2c3e50'}),
                 html.P(f"Type: {stop_click['properties']['type']}", style={'margin': '5px 0'}),
@@ -196,25 +410,23 @@ def display_info(stop_click, route_clicks):
     for route_click in route_clicks:
         if route_click:
             route_id = route_click['properties']['route_id']
-            route_stat = route_stats[route_stats['route_id'] == route_id]
-            if not route_stat.empty:
-                stat = route_stat.iloc[0]
+            stat = ROUTE_STATS_BY_ID.get(route_id)
+            if stat is not None:
                 return html.Div([
-                    html.H4(f"ðﾟﾚﾌ Route {stat['route_short_name']}", style={'margin': '0 0 10px 0', 'color': '#2c3e50'}),
-                    html.P(f"Type: {stat['route_desc']}", style={'margin': '5px 0'}),
-                    html.P(f"Trips: {stat['num_trips']}", style={'margin': '5px 0'}),
-                    html.P(f"Hours: {stat['start_time']} - {stat['end_time']}", style={'margin': '5px 0'}),
-                    html.P(f"Distance: {stat['service_distance']:.1f} km", style={'margin': '5px 0'}),
-                    html.P(f"Speed: {stat['service_speed']:.1f} km/h", style={'margin': '5px 0'})
+                    html.H4(f"ðﾟﾚﾌ Route {stat.route_short_name}", style={'margin': '0 0 10px 0', 'color': '#2c3e50'}),
+                    html.P(f"Type: {stat.route_desc}", style={'margin': '5px 0'}),
+                    html.P(f"Trips: {stat.num_trips}", style={'margin': '5px 0'}),
+                    html.P(f"Hours: {stat.start_time} - {stat.end_time}", style={'margin': '5px 0'}),
+                    html.P(f"Distance: {stat.service_distance:.1f} km", style={'margin': '5px 0'}),
+                    html.P(f"Speed: {stat.service_speed:.1f} km/h", style={'margin': '5px 0'})
                 ])
     
     return html.P("Click on a route or stop for details", style={'color': '#7f8c8d', 'font-style': 'italic'})
 
 def create_top_routes_chart():
     route_trip_counts = stop_route_info.groupby('route_id').size().reset_index(name='trip_count')
-    routes_df = feed.routes
     route_trip_counts = route_trip_counts.merge(routes_df[['route_id', 'route_short_name', 'route_type']], on='route_id')
-    route_trip_counts['route_desc'] = route_trip_counts['route_type'].map(types)
+    route_trip_counts['route_desc'] = lookup_route_type(route_trip_counts['route_type'], DESC_LUT)
     top_routes = route_trip_counts.nlargest(8, 'trip_count')
     
     fig = px.bar(
@@ -256,6 +468,11 @@ def create_trip_chart():
 
     return fig
 
+# Chart inputs are static per feed, so each figure is built once at startup
+TRIP_FIG = create_trip_chart()
+TOP_ROUTES_FIG = create_top_routes_chart()
+TOP_STOPS_FIG = create_top_stops_chart()
+
 app.layout = html.Div([
     # Header
     html.Div([
@@ -311,7 +528,7 @@ app.layout = html.Div([
     html.Div([
     # Trip timeline (full width)
         html.Div([
-            dcc.Graph(figure=create_trip_chart())
+            dcc.Graph(figure=TRIP_FIG)
         ], style={
             'background': 'white',
             'border-radius': '15px',
@@ -323,7 +540,7 @@ app.layout = html.Div([
         # Responsive side-by-side charts
         html.Div([
             html.Div([
-                dcc.Graph(figure=create_top_routes_chart())
+                dcc.Graph(figure=TOP_ROUTES_FIG)
             ], style={
                 'flex': '1',
                 'min-width': '300px',
@@ -335,7 +552,7 @@ app.layout = html.Div([
             }),
 
             html.Div([
-                dcc.Graph(figure=create_top_stops_chart())
+                dcc.Graph(figure=TOP_STOPS_FIG)
             ], style={
                 'flex': '1',
                 'min-width': '300px',
@@ -392,6 +609,12 @@ app.index_string = '''
 </html>
 '''
 
+# Move everything built at import into the permanent GC generation. Under
+# `gunicorn --preload`, collections in forked workers then skip these objects
+# instead of writing to them and unsharing their copy-on-write pages.
+gc.collect()
+gc.freeze()
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 8050))
     app.run(host="0.0.0.0", port=port)